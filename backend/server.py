@@ -1,9 +1,13 @@
 import os
-import io
+import json
+import logging
+import mmap
 import uuid
-from typing import Dict, List, Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Path
+from typing import BinaryIO, Dict, List, Optional
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Path, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import google.generativeai as genai
 import PyPDF2
@@ -14,9 +18,73 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Upload limits; the request body is counted as it arrives and cut off past the cap
+DEFAULT_MAX_UPLOAD_SIZE_MB = 10
+try:
+    MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", str(DEFAULT_MAX_UPLOAD_SIZE_MB)))
+except ValueError:
+    MAX_UPLOAD_SIZE_MB = 0
+if MAX_UPLOAD_SIZE_MB <= 0:
+    print("⚠️  WARNING: MAX_UPLOAD_SIZE_MB must be a positive whole number of megabytes!")
+    print(f"Falling back to the default upload limit of {DEFAULT_MAX_UPLOAD_SIZE_MB}MB")
+    MAX_UPLOAD_SIZE_MB = DEFAULT_MAX_UPLOAD_SIZE_MB
+MAX_UPLOAD_SIZE = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+# Allowance for multipart boundaries and part headers on top of the file itself
+UPLOAD_BODY_OVERHEAD = 64 * 1024
+UPLOAD_TOO_LARGE_DETAIL = f"File size too large. Maximum size is {MAX_UPLOAD_SIZE_MB}MB"
+
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized upload bodies while they are received, before multipart parsing spools them"""
+
+    def __init__(self, app, max_body_size: int, paths: tuple = ("/api/upload",)):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # Refuse up front when the client declares a body that is already too large
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse(
+                status_code=413,
+                content={"detail": UPLOAD_TOO_LARGE_DETAIL},
+                headers={"Connection": "close"},
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            # Chunked or mis-declared bodies are counted chunk by chunk and cut off past the cap
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=UPLOAD_TOO_LARGE_DETAIL,
+                        headers={"Connection": "close"},
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
 # Initialize FastAPI app
 app = FastAPI(title="Corpus AI - Legal Assistant API", version="1.0.0")
 
+# Limit upload bodies (added before CORS so 413 responses still carry CORS headers)
+app.add_middleware(UploadSizeLimitMiddleware, max_body_size=MAX_UPLOAD_SIZE + UPLOAD_BODY_OVERHEAD)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -40,9 +108,43 @@ if GEMINI_API_KEY:
 else:
     model = None
 
+# Optionally precompute a structured summary and risk scan after upload (set to "true" to enable);
+# this costs one extra Gemini call over the full contract per upload
+PRECOMPUTE_INSIGHTS = os.getenv("PRECOMPUTE_INSIGHTS", "false").lower() in ("1", "true", "yes")
+
 # In-memory storage for contract data
 contract_storage: Dict[str, Dict] = {}
 
+# Overview topics precomputed at upload, with the topic phrases an overview question may name
+INSIGHT_TOPICS = {
+    "parties": ("Parties", ["parties", "contracting parties"]),
+    "term": ("Term", ["term", "contract term", "agreement term", "duration", "term and renewal"]),
+    "termination": ("Termination", ["termination", "termination clause", "termination clauses", "termination provisions", "termination rights"]),
+    "liability_cap": ("Liability Cap", ["liability cap", "cap on liability", "limitation of liability", "limit of liability", "liability limit"]),
+    "governing_law": ("Governing Law", ["governing law", "applicable law", "governing law and jurisdiction"]),
+}
+
+# A question is served from insights only when the whole question is a plain overview phrasing,
+# e.g. "What is the governing law of this agreement?"; anything more specific goes to the model.
+# "Who" only asks about the parties, and "what" only about the other topics.
+INSIGHT_QUESTION_PREFIXES = {
+    "parties": r"(?:who are|list|tell me)",
+}
+INSIGHT_DEFAULT_QUESTION_PREFIX = r"(?:what is|what are|whats|tell me)"
+INSIGHT_QUESTION_SUFFIX = r"(?:of|in|under|to|for) (?:this|the) (?:contract|agreement)"
+INSIGHT_QUESTION_PATTERNS = {
+    key: re.compile(
+        rf"^(?:{INSIGHT_QUESTION_PREFIXES.get(key, INSIGHT_DEFAULT_QUESTION_PREFIX)} )?(?:the )?"
+        rf"(?:{'|'.join(re.escape(phrase) for phrase in phrases)})"
+        rf"(?: {INSIGHT_QUESTION_SUFFIX})?$"
+    )
+    for key, (_, phrases) in INSIGHT_TOPICS.items()
+}
+
+INSIGHT_NOT_SPECIFIED = "Not specified in the contract"
+
+INSIGHT_FAILURE_MESSAGE = "Contract insights could not be generated. Ask questions directly instead."
+
 class QuestionRequest(BaseModel):
     question: str
     contract_id: str
@@ -59,6 +161,7 @@ class AnswerResponse(BaseModel):
     contract_id: str
     question: str
     timestamp: str
+    source: str = "model"
 
 
 class ClauseSuggestionRequest(BaseModel):
@@ -76,10 +179,23 @@ class ClauseSuggestionResponse(BaseModel):
     guidance_summary: str
     timestamp: str
 
-def extract_text_from_pdf(file_content: bytes) -> tuple[str, int]:
-    """Extract text from PDF file and return text with page count"""
+def extract_text_from_upload(upload_spool: BinaryIO) -> tuple[str, int]:
+    """Extract text from Starlette's upload spool through a memory-mapped view of the PDF"""
+    # Starlette keeps small uploads in memory; roll them over so the spool is a real file on disk
+    if hasattr(upload_spool, "rollover"):
+        upload_spool.rollover()
+    upload_spool.flush()
+    
+    if os.fstat(upload_spool.fileno()).st_size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    
+    with mmap.mmap(upload_spool.fileno(), 0, access=mmap.ACCESS_READ) as pdf_map:
+        return extract_text_from_pdf(pdf_map)
+
+def extract_text_from_pdf(pdf_stream) -> tuple[str, int]:
+    """Extract text from a seekable PDF stream and return text with page count"""
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+        pdf_reader = PyPDF2.PdfReader(pdf_stream)
         text_content = ""
         page_count = len(pdf_reader.pages)
         
@@ -180,6 +296,134 @@ Please provide a detailed, accurate answer based solely on the contract content
     return prompt
 
 
+def generate_insights_prompt(contract_chunks: List[str]) -> str:
+    """Generate a prompt asking Gemini for a structured contract overview and risk scan"""
+
+    combined_content = "\n\n".join([f"[Chunk {i+1}]:\n{chunk}" for i, chunk in enumerate(contract_chunks)])
+
+    prompt = f"""You are an expert legal contract analyst with deep knowledge of Indian and international contract law. Review the contract sections below and produce a structured overview.
+
+IMPORTANT GUIDELINES:
+1. Base your analysis STRICTLY on the contract content provided
+2. If a field is not addressed in the contract, use the value "Not specified in the contract"
+3. Provide specific clause references where possible
+4. Keep each field concise (at most 3 sentences)
+
+CONTRACT SECTIONS:
+{combined_content}
+
+OUTPUT FORMAT:
+Return ONLY a JSON object, with no surrounding text or code fences, using exactly these keys:
+{{
+  "parties": "<the contracting parties and their roles>",
+  "term": "<effective date, duration and renewal>",
+  "termination": "<termination rights, notice periods and consequences>",
+  "liability_cap": "<limitation of liability and any carve-outs>",
+  "governing_law": "<governing law, jurisdiction and dispute resolution>",
+  "risks": [
+    {{"title": "<short risk title>", "severity": "high|medium|low", "detail": "<why it matters, with clause reference>"}}
+  ]
+}}"""
+
+    return prompt
+
+
+def parse_insights_response(response_text: str) -> Dict:
+    """Parse the model's JSON overview, tolerating code fences and missing fields"""
+
+    cleaned = response_text.strip()
+    cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
+    cleaned = re.sub(r'\s*```$', '', cleaned)
+
+    match = re.search(r'\{.*\}', cleaned, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON object found in model response")
+
+    raw = json.loads(match.group(0))
+
+    def text_field(value) -> str:
+        # Nested objects or lists would surface as Python reprs, so treat them as missing
+        return value.strip() if isinstance(value, str) else ""
+
+    summary = {key: text_field(raw.get(key)) or INSIGHT_NOT_SPECIFIED for key in INSIGHT_TOPICS}
+
+    risks = []
+    raw_risks = raw.get("risks")
+    for risk in raw_risks if isinstance(raw_risks, list) else []:
+        if not isinstance(risk, dict):
+            continue
+        title = text_field(risk.get("title"))
+        if not title:
+            continue
+        severity = text_field(risk.get("severity")).lower()
+        risks.append(
+            {
+                "title": title,
+                "severity": severity if severity in ("high", "medium", "low") else "medium",
+                "detail": text_field(risk.get("detail")),
+            }
+        )
+
+    return {"summary": summary, "risks": risks}
+
+
+def precompute_contract_insights(contract_id: str) -> None:
+    """Background stage: store a structured summary and risk scan on the contract record"""
+
+    contract_data = contract_storage.get(contract_id)
+    if contract_data is None:
+        return
+
+    try:
+        prompt = generate_insights_prompt(contract_data["chunks"])
+        response = model.generate_content(prompt)
+
+        if not response.text:
+            raise ValueError("Empty response from AI")
+
+        insights = parse_insights_response(response.text)
+        contract_data["insights"] = {
+            "status": "ready",
+            **insights,
+            "generated_at": datetime.now().isoformat(),
+        }
+    except Exception:
+        # Keep client and API details in the server log, not the public insights payload
+        logger.exception("Insight precomputation failed for contract %s", contract_id)
+        contract_data["insights"] = {
+            "status": "failed",
+            "error": INSIGHT_FAILURE_MESSAGE,
+            "generated_at": datetime.now().isoformat(),
+        }
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase a question and reduce it to single-spaced words"""
+
+    normalized = question.lower().replace("'", "").replace("\u2019", "")
+    return " ".join(re.findall(r"[a-z0-9]+", normalized))
+
+
+def match_precomputed_answer(question: str, insights: Optional[Dict]) -> Optional[str]:
+    """Answer plain overview questions from precomputed insights, or return None"""
+
+    if not insights or insights.get("status") != "ready":
+        return None
+
+    normalized = normalize_question(question)
+    matched = [key for key, pattern in INSIGHT_QUESTION_PATTERNS.items() if pattern.match(normalized)]
+    if len(matched) != 1:
+        return None
+
+    key = matched[0]
+    value = insights["summary"].get(key, INSIGHT_NOT_SPECIFIED)
+    # Let the model search the full contract when the overview came up empty
+    if value == INSIGHT_NOT_SPECIFIED:
+        return None
+
+    return f"**{INSIGHT_TOPICS[key][0]}**\n{value}"
+
+
 def generate_clause_suggestion_prompt(
     clause_text: str,
     playbook: Optional[str] = None,
@@ -226,22 +470,21 @@ async def health_check():
     return {"status": "active", "service": "Corpus AI Legal Assistant API"}
 
 @app.post("/api/upload", response_model=ContractResponse)
-async def upload_contract(file: UploadFile = File(...)):
+async def upload_contract(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """Upload and process a PDF contract"""
     
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    if file.size and file.size > 10 * 1024 * 1024:  # 10MB limit
-        raise HTTPException(status_code=400, detail="File size too large. Maximum size is 10MB")
+    # Starlette counts each part's bytes while parsing, so this catches files that fit
+    # within the multipart allowance of the body limit but are still over the cap
+    if file.size and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=UPLOAD_TOO_LARGE_DETAIL)
     
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Extract text from PDF
-        text_content, page_count = extract_text_from_pdf(file_content)
+        # Map Starlette's spool and extract text in a worker thread so large uploads don't block the event loop
+        text_content, page_count = await run_in_threadpool(extract_text_from_upload, file.file)
         
         # Chunk the text intelligently
         chunks = intelligent_chunk_text(text_content)
@@ -255,9 +498,14 @@ async def upload_contract(file: UploadFile = File(...)):
             "text_content": text_content,
             "chunks": chunks,
             "page_count": page_count,
-            "upload_time": datetime.now().isoformat()
+            "upload_time": datetime.now().isoformat(),
+            "insights": {"status": "pending" if PRECOMPUTE_INSIGHTS and model else "disabled"}
         }
         
+        # Precompute the contract overview after the response is sent
+        if PRECOMPUTE_INSIGHTS and model:
+            background_tasks.add_task(precompute_contract_insights, contract_id)
+        
         return ContractResponse(
             contract_id=contract_id,
             filename=file.filename,
@@ -292,6 +540,17 @@ async def ask_question(request: QuestionRequest):
         contract_data = contract_storage[request.contract_id]
         chunks = contract_data["chunks"]
         
+        # Serve overview questions from the precomputed insights when available
+        precomputed_answer = match_precomputed_answer(request.question, contract_data.get("insights"))
+        if precomputed_answer:
+            return AnswerResponse(
+                answer=precomputed_answer,
+                contract_id=request.contract_id,
+                question=request.question,
+                timestamp=datetime.now().isoformat(),
+                source="insights"
+            )
+        
         # Generate prompt for Gemini
         prompt = generate_legal_prompt(request.question, chunks)
         
@@ -331,6 +590,21 @@ async def get_contract_info(contract_id: str):
     }
 
 
+@app.get("/api/contracts/{contract_id}/insights")
+async def get_contract_insights(contract_id: str):
+    """Return the precomputed summary and risk scan for a contract."""
+
+    if contract_id not in contract_storage:
+        raise HTTPException(status_code=404, detail="Contract not found")
+
+    insights = contract_storage[contract_id].get("insights", {"status": "disabled"})
+
+    return {
+        "contract_id": contract_id,
+        **insights,
+    }
+
+
 @app.get("/api/contracts/{contract_id}/clauses")
 async def list_contract_clauses(contract_id: str):
     """Return all clause chunks for a contract."""
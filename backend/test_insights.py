@@ -0,0 +1,112 @@
+"""Unit tests for the contract insights helpers in server.py
+
+Run from the backend directory with: python -m unittest test_insights
+"""
+import json
+import unittest
+
+from server import (
+    INSIGHT_NOT_SPECIFIED,
+    INSIGHT_TOPICS,
+    match_precomputed_answer,
+    parse_insights_response,
+)
+
+
+class ParseInsightsResponseTests(unittest.TestCase):
+    def test_strips_code_fences_and_whitespace(self):
+        insights = parse_insights_response(
+            '```json\n{"parties": " A and B ", "governing_law": "India", '
+            '"risks": [{"title": "Uncapped indemnity", "severity": "HIGH", "detail": "Clause 9"}]}\n```'
+        )
+        self.assertEqual(insights["summary"]["parties"], "A and B")
+        self.assertEqual(insights["summary"]["governing_law"], "India")
+        self.assertEqual(
+            insights["risks"],
+            [{"title": "Uncapped indemnity", "severity": "high", "detail": "Clause 9"}],
+        )
+
+    def test_missing_fields_are_not_specified(self):
+        insights = parse_insights_response('{"parties": "A and B"}')
+        self.assertEqual(set(insights["summary"]), set(INSIGHT_TOPICS))
+        self.assertEqual(insights["summary"]["term"], INSIGHT_NOT_SPECIFIED)
+        self.assertEqual(insights["risks"], [])
+
+    def test_non_string_fields_are_not_specified(self):
+        insights = parse_insights_response(json.dumps({
+            "parties": {"name": "A"},
+            "term": ["1 year"],
+            "termination": 5,
+            "liability_cap": "",
+            "risks": [{"title": {"x": 1}}, "bad", {"title": "Cap", "severity": "CRITICAL", "detail": ["x"]}],
+        }))
+        for key in ("parties", "term", "termination", "liability_cap"):
+            self.assertEqual(insights["summary"][key], INSIGHT_NOT_SPECIFIED, key)
+        self.assertEqual(insights["risks"], [{"title": "Cap", "severity": "medium", "detail": ""}])
+
+    def test_non_list_risks_are_ignored(self):
+        self.assertEqual(parse_insights_response('{"risks": "none"}')["risks"], [])
+
+    def test_invalid_json_raises(self):
+        for invalid in ('```json\n{parties: A}\n```', "Sorry, I cannot help with that."):
+            with self.subTest(response=invalid):
+                with self.assertRaises(ValueError):
+                    parse_insights_response(invalid)
+
+
+class MatchPrecomputedAnswerTests(unittest.TestCase):
+    def setUp(self):
+        self.insights = {
+            "status": "ready",
+            "summary": {key: f"{key} summary" for key in INSIGHT_TOPICS},
+            "risks": [],
+        }
+
+    def test_overview_questions_are_served(self):
+        overview_questions = {
+            "What is the governing law?": "governing_law",
+            "Who are the parties to this agreement?": "parties",
+            "What are the termination clauses in this contract?": "termination",
+            "What's the term of the contract?": "term",
+            "What is the liability cap under this agreement?": "liability_cap",
+            "Tell me the governing law": "governing_law",
+            "List the parties": "parties",
+        }
+        for question, key in overview_questions.items():
+            with self.subTest(question=question):
+                answer = match_precomputed_answer(question, self.insights)
+                self.assertIsNotNone(answer)
+                self.assertIn(f"{key} summary", answer)
+
+    def test_specific_questions_go_to_the_model(self):
+        specific_questions = [
+            "Is the determination of fees fixed?",
+            "Can a third party enforce this agreement?",
+            "Who pays if the other party breaches?",
+            "Who is the counterparty?",
+            "How long is the notice period?",
+            "What happens to confidentiality after expiration?",
+            "Who are the parties and what is the term?",
+            "Explain the termination",
+            "Explain the termination clauses",
+            "Summarize the termination clauses",
+            "Show me the termination clauses",
+            "Who is the governing law of this contract?",
+            "What are the parties?",
+            "Who is the term?",
+        ]
+        for question in specific_questions:
+            with self.subTest(question=question):
+                self.assertIsNone(match_precomputed_answer(question, self.insights))
+
+    def test_insights_not_ready_are_not_served(self):
+        self.assertIsNone(match_precomputed_answer("What is the governing law?", {"status": "pending"}))
+        self.assertIsNone(match_precomputed_answer("What is the governing law?", None))
+
+    def test_unspecified_topics_go_to_the_model(self):
+        self.insights["summary"]["governing_law"] = INSIGHT_NOT_SPECIFIED
+        self.assertIsNone(match_precomputed_answer("What is the governing law?", self.insights))
+
+
+if __name__ == "__main__":
+    unittest.main()